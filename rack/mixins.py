@@ -1,7 +1,12 @@
 from   __future__  import annotations
-from   dataclasses import asdict, dataclass, field, fields, InitVar, KW_ONLY
-from   typing      import Any, Iterable, Iterator
-import json
+from   dataclasses import asdict, dataclass, field, fields, InitVar, KW_ONLY, is_dataclass
+from   enum        import Enum
+from   typing      import Any, Callable, Iterable, Iterator
+import json, math
+
+# optional - much faster compact json
+try   : import orjson
+except: orjson = None
 
 
 # __all__ would literally be all
@@ -9,6 +14,69 @@ import json
 # including the above imports
 
 
+# values of these types are returned as-is by `_to_dict`
+_ATOMIC_TYPES = frozenset((str, int, float, bool, type(None), bytes))
+
+# `dataclasses.asdict` without the `copy.deepcopy` of every field
+# dataclass -> dict, containers are rebuilt, everything else is returned unchanged
+def _to_dict(obj:Any) -> Any:
+    if (T := type(obj)) in _ATOMIC_TYPES:
+        return obj
+    
+    if is_dataclass(obj) and not isinstance(obj, type):
+        names = T._field_names() if issubclass(T, Dataclass_mi) else tuple(f.name for f in fields(obj))
+        return {n:_to_dict(getattr(obj, n)) for n in names}
+        
+    # comprehensions instead of `type(obj)(generator)` for the exact builtin types
+    if T is list : return [_to_dict(v) for v in obj]
+    if T is tuple: return tuple([_to_dict(v) for v in obj])
+    if T is set  : return {_to_dict(v) for v in obj}
+        
+    if isinstance(obj, list|tuple|set):
+        return type(obj)(_to_dict(v) for v in obj)
+        
+    if isinstance(obj, dict):
+        return type(obj)((_to_dict(k), _to_dict(v)) for k, v in obj.items())
+        
+    return obj
+
+
+# dict key types that `json` accepts
+_JSON_KEYS = frozenset((str, int, float, bool, type(None)))
+
+# False if `obj` holds anything orjson would write differently than `json` (or not at all):
+# NaN/inf (orjson writes null), ints beyond 64 bits (orjson raises), Enums (orjson writes their value)
+# and dict keys `json` rejects
+def _orjson_safe(obj:Any) -> bool:
+    if (T := type(obj)) in (str, bool) or obj is None: return True
+    if T is float                                    : return math.isfinite(obj)
+    if T is int                                      : return -2**63 <= obj < 2**64
+    if isinstance(obj, Enum)                         : return False
+    if isinstance(obj, dict):
+        return all((type(k) in _JSON_KEYS) and _orjson_safe(k) and _orjson_safe(v) for k, v in obj.items())
+    if isinstance(obj, list|tuple):
+        return all(map(_orjson_safe, obj))
+    return True
+
+# json string of `obj` - `str` is the fallback for anything that isn't serializable
+# pretty output stays on `json` to keep the 4 space indent (orjson only does 2)
+# datetimes and dataclasses are passed through to `str`, like `json` does, so both write the same values
+def _dumps(obj:Any, pretty:bool=False) -> str:
+    if orjson and not pretty and _orjson_safe(obj):
+        opts = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        try   : return orjson.dumps(obj, default=str, option=opts).decode()
+        except orjson.JSONEncodeError: ...
+                
+    return json.dumps(obj, indent=(None, 4)[pretty], default=str)
+    
+# orjson rejects the NaN/Infinity tokens that `json` writes
+def _loads(data:str|bytes) -> Any:
+    if orjson:
+        try   : return orjson.loads(data)
+        except orjson.JSONDecodeError: ...
+    return json.loads(data)
+
+
 """ Dataclass_mi: dataclass mixin for useful dictionary-related behavior
   supports:
     *) .keys(), .values(), .items()
@@ -21,9 +89,26 @@ import json
       +) optional __post_init__ call after reassignment
 """
 class Dataclass_mi:
+    # fields are fixed per class, so they are only gathered once
+    # this can't happen in __init_subclass__ because @dataclass hasn't processed the class yet
+    @classmethod
+    def _fields(cls) -> tuple:
+        if (flds := cls.__dict__.get('__fields_cache__')) is None:
+            flds = fields(cls)
+            setattr(cls, '__fields_cache__', flds)
+            setattr(cls, '__field_names_cache__', tuple(f.name for f in flds))
+        return flds
+        
+    @classmethod
+    def _field_names(cls) -> tuple:
+        if (names := cls.__dict__.get('__field_names_cache__')) is None:
+            cls._fields()
+            names = cls.__field_names_cache__
+        return names
+        
     @property
     def asdict(self) -> dict:
-        return asdict(self)
+        return _to_dict(self)
       
     def items(self) -> Iterable:
         return self.asdict.items()
@@ -37,11 +122,11 @@ class Dataclass_mi:
         
     # create kwargs from args of keys to include or omit
     def kwargs(self, *args, omit:bool=False) -> dict:
-        return {key:getattr(self, key) for fld in fields(self) if ((key := fld.name) in args) ^ omit}
+        return {key:getattr(self, key) for key in self._field_names() if (key in args) ^ omit}
     
     # create kwargs from args of keys to include or omit
     def args(self, *args, omit:bool=False) -> list:
-        return [getattr(self, key) for fld in fields(self) if ((key := fld.name) in args) ^ omit]
+        return [getattr(self, key) for key in self._field_names() if (key in args) ^ omit]
         
     # required for dictionary unpacking  
     # an error will be raised if this key does not exist
@@ -50,11 +135,11 @@ class Dataclass_mi:
     
     # json no indent
     def __repr__(self) -> str:
-        return json.dumps(self.asdict, default=str)
+        return _dumps(self.asdict)
     
     # pretty-printed json
     def __str__(self) -> str:
-        return json.dumps(self.asdict, indent=4, default=str)
+        return _dumps(self.asdict, True)
     
     # reassign fields from kwargs and optionally call __post_init__
     def __call__(self, initvars:dict|None=None, **kwargs) -> Dataclass_mi:
@@ -1,27 +1,51 @@
 import re
-from typing import Any, Callable
+from functools import lru_cache
+from typing    import Any, Callable
+
+# optional - vectorized numeric queries (numba additionally compiles them)
+try   : import numpy as np
+except: np = None
+
+try   : import numba
+except: numba = None
 
 __all__ = ('Query',)
 
-_noop = lambda _: _
+# every operator is a single flat function - no nested op/format helpers
+# `*_lower` variants compare the lowercased str of `a` with the lowercased `b`
+
+def _in(a, b)       : return a in b
+def _not_in(a, b)   : return a not in b
+def _sw(a, b)       : return a.startswith(b)
+def _not_sw(a, b)   : return not a.startswith(b)
+def _ew(a, b)       : return a.endswith(b)
+def _not_ew(a, b)   : return not a.endswith(b)
+def _eq(a, b)       : return a == b
+def _ne(a, b)       : return a != b
+def _is(a, b)       : return a is b
+def _le(a, b)       : return a <= b
+def _ge(a, b)       : return a >= b
+def _lt(a, b)       : return a < b
+def _gt(a, b)       : return a > b
 
-# formats the RSE of an `in` conditon with `op`
-# if `op` is `_noop`, this does nothing 
-def _format_in(data:Any, op:Callable=_noop) -> Any:
-    if op is _noop: return data
+def _in_lower(a, b):
+    a = f'{a}'.lower()
+    if isinstance(b, list|tuple|set):
+        return a in {f'{x}'.lower() for x in b}
+    return a in f'{b}'.lower()
     
-    if isinstance(data, list|tuple|set):
-        results = type(data)(op(f'{x}') for x in data)
-    else:
-        results = op(f'{data}')
-        
-    return results
+def _not_in_lower(a, b):
+    a = f'{a}'.lower()
+    if isinstance(b, list|tuple|set):
+        return a not in {f'{x}'.lower() for x in b}
+    return a not in f'{b}'.lower()
 
-# all of these functions support str.lower
-_in  = lambda a, b, op=_noop: op(a) in _format_in(b, op)
-_sw  = lambda a, b, op=_noop: op(a).startswith(op(b))
-_ew  = lambda a, b, op=_noop: op(a).endswith(op(b))
-_eq  = lambda a, b, op=_noop: op(a) == op(b)
+def _sw_lower(a, b)     : return f'{a}'.lower().startswith(b.lower())
+def _not_sw_lower(a, b) : return not f'{a}'.lower().startswith(b.lower())
+def _ew_lower(a, b)     : return f'{a}'.lower().endswith(b.lower())
+def _not_ew_lower(a, b) : return not f'{a}'.lower().endswith(b.lower())
+def _eq_lower(a, b)     : return f'{a}'.lower() == b.lower()
+def _ne_lower(a, b)     : return f'{a}'.lower() != b.lower()
 
 # dictionary of possible operators for query comparisons
 # !  : not (must be first character of operator - exs: !=(not equal), !->(not in))
@@ -32,97 +56,151 @@ _eq  = lambda a, b, op=_noop: op(a) == op(b)
 # %> : a.endswith(b)
 # -> : a in b
 # => : a is b
-_operators = {'!->.' :lambda a,b: not _in(f'{a}', b, str.lower),
-              '!<%.' :lambda a,b: not _sw(f'{a}', b, str.lower),
-              '!%>.' :lambda a,b: not _ew(f'{a}', b, str.lower),
-              '!=.'  :lambda a,b: not _eq(f'{a}', b, str.lower),
-              '->.'  :lambda a,b: _in(f'{a}', b, str.lower),
-              '<%.'  :lambda a,b: _sw(f'{a}', b, str.lower),
-              '%>.'  :lambda a,b: _ew(f'{a}', b, str.lower),
-              '==.'  :lambda a,b: _eq(f'{a}', b, str.lower),
-              '!->'  :lambda a,b: not _in(a, b),
-              '!<%'  :lambda a,b: not _sw(a, b),
-              '!%>'  :lambda a,b: not _ew(a, b),
-              '!='   :lambda a,b: not _eq(a, b),
-              '->'   :lambda a,b: _in(a, b),
-              '<%'   :lambda a,b: _sw(a, b),
-              '%>'   :lambda a,b: _ew(a, b),
-              '=='   :lambda a,b: _eq(a, b),
-              '=>'   :lambda a,b: a is b,
-              '<='   :lambda a,b: a <= b,
-              '>='   :lambda a,b: a >= b,
-              '<'    :lambda a,b: a < b,
-              '>'    :lambda a,b: a > b}
+_operators = {'!->.' :_not_in_lower,
+              '!<%.' :_not_sw_lower,
+              '!%>.' :_not_ew_lower,
+              '!=.'  :_ne_lower,
+              '->.'  :_in_lower,
+              '<%.'  :_sw_lower,
+              '%>.'  :_ew_lower,
+              '==.'  :_eq_lower,
+              '!->'  :_not_in,
+              '!<%'  :_not_sw,
+              '!%>'  :_not_ew,
+              '!='   :_ne,
+              '->'   :_in,
+              '<%'   :_sw,
+              '%>'   :_ew,
+              '=='   :_eq,
+              '=>'   :_is,
+              '<='   :_le,
+              '>='   :_ge,
+              '<'    :_lt,
+              '>'    :_gt}
         
+# longest operators first so the regex alternation never stops at a shorter prefix
+_operators = dict(sorted(_operators.items(), key=lambda it: len(it[0]), reverse=True))
+
+# operators that `Query.compile_numeric` can turn into array comparisons
+_NUMERIC_OPS = frozenset(('<', '>', '<=', '>=', '==', '!='))
+
 # format _operators keys for regex group
-_oper = '|'.join(map(re.escape, _operators.keys()))
+_oper  = '|'.join(map(re.escape, _operators.keys()))
+_OP_RE = re.compile(fr'\s*({_oper})\s*')
         
 class Query:
     QUERY_DIVIDER = '::'
     LIST_DIVIDER  = ','
     ARGS_DIVIDER  = ';'
     
-    OPERATOR_SPLIT = re.compile(fr'\s*({_oper})\s*').split
+    OPERATOR_SPLIT = _OP_RE.split
     NUMBER_MATCH   = re.compile(r'-?\d*(\.\d+)?').fullmatch
     STRING_MATCH   = re.compile(r'("|\')(?P<str>.*)\1').fullmatch
 
     @staticmethod
     def cast(value:str) -> list|float|int|bool|str|None:
-        out   = None
+        # already cast
+        if isinstance(value, int|float|bool):
+            return value
+            
         value = value.strip()
+        out   = [value]
         
-        if len((out := value.split(Query.LIST_DIVIDER))) > 1:
-            out = [Query.cast(v) for v in out]
+        # only split when there is something to split on
+        if Query.LIST_DIVIDER in value:
+            out = [Query.cast(v) for v in value.split(Query.LIST_DIVIDER)]
         elif (v := value.lower()) in ('true', 'false'):
             out = v == "true"
-        elif m := Query.STRING_MATCH(value):
+        elif m := _STRING_MATCH(value):
             out = m.group('str')
-        elif m := Query.NUMBER_MATCH(value):
+        elif m := _NUMBER_MATCH(value):
             out = (int,float)['.' in v](v)
             
         return out
     
     @staticmethod # reformat raw data to applicable query args
     def format(data:Any, _lvl:int=0) -> list:
+        # scalars are by far the most common args - skip the container checks
+        if isinstance(data, str):
+            data = f'"{data}"'
+            return data if _lvl else [data]
+            
+        if isinstance(data, int|float|bool):
+            data = f'{data}'
+            return data if _lvl else [data]
+            
         if isinstance(data, list|tuple|set):
             data = [Query.format(item, _lvl+1) for item in data]
             if _lvl: data = Query.LIST_DIVIDER.join(data)
         else:       
-            data = f'"{data}"' if isinstance(data, str) else f'{data}'
+            data = f'{data}'
             if not _lvl: data = [data]
         
         return data
     
-    @staticmethod # check conditions against a data source
-    def check_conditions(data:dict, conditions:str) -> bool:
-        # stores condition results
-        facts = []
+    @staticmethod # parse conditions once into a reusable `predicate(data) -> bool`
+    @lru_cache(maxsize=256)
+    def compile(conditions:str) -> Callable[[dict], bool]:
+        checks = tuple((_operators.get(op), a, b) for op, a, b in _parse(conditions))
+        
+        def predicate(data:dict) -> bool:
+            # the first failed comparison decides - nothing after it is evaluated
+            for op, (a, ca), (b, cb) in checks:
+                if not op(data.get(a, ca), data.get(b, cb)):
+                    return False
+            return True
+        
+        return predicate
     
-        for cond in conditions.split(Query.ARGS_DIVIDER):
-            # stores values and operators
-            v, o = [], []
-            
-            # parse values and operators
-            for c in Query.OPERATOR_SPLIT(cond):
-                if (c := c.strip()) in _operators:
-                    # store operator function
-                    o.append(_operators.get(c))
-                else:
-                    # try data[c] else cast c
-                    v.append(data.get(c, Query.cast(c)))
-                
-            # make sure values length is one more than operators              
-            if (len(v) - len(o)) != 1:
-                raise ValueError
-                
+    @staticmethod # numeric-only conditions as `(field names, select(columns) -> matching row indexes)`
+    @lru_cache(maxsize=256)
+    def compile_numeric(conditions:str) -> tuple|None:
+        # None means "use `Query.compile`"
+        # every comparison has to be one of _NUMERIC_OPS between fields and int|float literals
+        if np is None: return None
+        
+        fields, literals, terms = [], [], []
+        
+        # literals are kernel arguments, so conditions that only differ by value share one kernel
+        def operand(key:str, value:Any) -> str|None:
+            if type(value) in (int, float):
+                literals.append(value)
+                return f'lit{len(literals) - 1}'
+            # an unmatched literal is cast to [key] - that is a field name
+            if isinstance(value, list) and key.isidentifier():
+                if key not in fields: fields.append(key)
+                return f'col{fields.index(key)}'
+            return None
+        
+        for op, (a, ca), (b, cb) in _parse(conditions):
+            if (op not in _NUMERIC_OPS) or None in (A := operand(a, ca), B := operand(b, cb)):
+                return None
+            terms.append(f'({A} {op} {B})')
             
-            facts += [o[i](*v[i:i+2]) for i in range(len(o))]
+        if not fields: return None
         
-        return all(facts)
+        kernel   = _numeric_kernel(' & '.join(terms), len(fields), len(literals))
+        literals = tuple(literals)
+        
+        # None if any column isn't a flat run of numbers (ex: missing field, None, str or list values)
+        def select(columns:list) -> list|None:
+            try   : columns = [np.asarray(col) for col in columns]
+            except ValueError: return None # lists of different lengths
+            
+            if any((col.ndim != 1) or (col.dtype.kind not in 'biuf') for col in columns):
+                return None
+            return np.flatnonzero(kernel(*columns, *literals)).tolist()
+            
+        return tuple(fields), select
+    
+    @staticmethod # check conditions against a data source
+    def check_conditions(data:dict, conditions:str) -> bool:
+        return Query.compile(conditions)(data)
     
     @staticmethod
-    def params(query:str) -> list|None:
-        params = [None, *query.split(Query.QUERY_DIVIDER)][-2:]
+    @lru_cache(maxsize=1024) # results are shared, so they are immutable
+    def params(query:str) -> tuple|None:
+        params = (None, *query.split(Query.QUERY_DIVIDER))[-2:]
         return None if (None in params) else params
         
     @staticmethod
@@ -132,4 +210,63 @@ class Query:
         args   = nargs[:L]
         kwargs = dict(zip(kwargs.keys(), nargs[L:]))
         return Query.QUERY_DIVIDER.join((typekey, conditions.format(*args, **kwargs)))
+
+
+# module-level aliases spare the `Query.` attribute lookups in the per-entry loops
+_OPERATOR_SPLIT = Query.OPERATOR_SPLIT
+_NUMBER_MATCH   = Query.NUMBER_MATCH
+_STRING_MATCH   = Query.STRING_MATCH
+
+# ((operator, (key, cast key), (key, cast key)), ...) for every comparison in conditions
+@lru_cache(maxsize=256)
+def _parse(conditions:str) -> tuple:
+    checks = []
+    
+    for cond in conditions.split(Query.ARGS_DIVIDER):
+        # stores values and operators
+        v, o = [], []
+        
+        # parse values and operators
+        for c in _OPERATOR_SPLIT(cond):
+            if (c := c.strip()) in _operators:
+                o.append(c)
+            else:
+                # data[c] is tried first when the conditions are checked, else cast c
+                v.append((c, _cast_fast(c)))
+            
+        # make sure values length is one more than operators              
+        if (len(v) - len(o)) != 1:
+            raise ValueError
+            
+        checks += [(o[i], *v[i:i+2]) for i in range(len(o))]
+        
+    return tuple(checks)
+
+# `def kernel(col0.., lit0..): return expression` - keyed on the expression, never on literal values
+@lru_cache(maxsize=64)
+def _numeric_kernel(expression:str, ncols:int, nlits:int) -> Callable:
+    args   = ', '.join((*(f'col{i}' for i in range(ncols)), *(f'lit{i}' for i in range(nlits))))
+    source = f'def kernel({args}):\n    return {expression}'
+    exec(source, (ns := {}))
+    return ns['kernel'] if numba is None else numba.njit(parallel=True)(ns['kernel'])
+
+# `Query.cast` without any regex - same results, except quoted strings may also contain newlines
+def _cast_fast(value:str) -> list|float|int|bool|str|None:
+    value = value.strip()
     
+    if Query.LIST_DIVIDER in value:
+        return [_cast_fast(v) for v in value.split(Query.LIST_DIVIDER)]
+        
+    if (v := value.lower()) in ('true', 'false'):
+        return v == "true"
+        
+    # STRING_MATCH: same quote on both ends
+    if len(value) > 1 and value[0] in '"\'' and value[-1] == value[0]:
+        return value[1:-1]
+        
+    # NUMBER_MATCH: optional `-`, digits, optional `.` with at least one digit after it
+    whole, dot, frac = (v[1:] if v[:1] == '-' else v).partition('.')
+    if (not whole or whole.isdecimal()) and ((not dot) or frac.isdecimal()):
+        return (int,float)[bool(dot)](v)
+        
+    return [value]
@@ -1,18 +1,34 @@
 #from __future__ import annotations
-import shelve, zipfile as zf
+import sys, zipfile as zf
+from   contextlib  import contextmanager
 from   copy        import deepcopy
 from   .query      import Query
+from   .store      import ShelfStore, SqliteStore
 from   .constants  import *
 from   .mixins     import *
+from   .mixins     import _dumps, _loads, _to_dict
 
+# optional - multithreaded backup compression
+try   : import zstandard as zstd
+except: zstd = None
 
-__all__ = 'Database', 'Entry', 'Tag', 'Query', 'UNIQUE'
+# optional - array sorting
+try   : import numpy as np
+except: np = None
+
+
+__all__ = 'Database', 'Entry', 'Tag', 'Query', 'UNIQUE', 'ShelfStore', 'SqliteStore'
 
     
 @dataclass
 class Entry(Dataclass_mi):
     # this version of type exists for registration and needs to be overwritten in a subclass
     TYPE = 'all'
+    
+    # type strings are compared constantly - interned, those comparisons are mostly identity checks
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.TYPE = sys.intern(cls.TYPE)
 
     id  : str|int
     _   : KW_ONLY
@@ -34,17 +50,32 @@ class Entry(Dataclass_mi):
         
     @property 
     def asdict(self) -> dict:
-        return {key:self.__serialize(value) for key, value in asdict(self).items()}
+        return _to_dict(self)
         
     @property
     def query(self) -> str:
         return f'{self.TYPE}{QUERY_SEP}'
         
+    # `fk_*` fields are fixed per class, so they are only matched against FOREIGNKEY once
+    # __fk_map__      : ((fk_field, key), ...)
+    # __fk_keys__     : (key, ...)
+    # __display_keys__: field names with every fk field swapped for it's key
+    @classmethod
+    def _fk_map(cls) -> tuple:
+        if (fk_map := cls.__dict__.get('__fk_map__')) is None:
+            names  = cls._field_names()
+            fk_map = tuple((name, m.group('key')) for name in names if (m := FOREIGNKEY(name)))
+            fks    = dict(fk_map)
+            setattr(cls, '__fk_map__'      , fk_map)
+            setattr(cls, '__fk_keys__'     , tuple(fks.values()))
+            setattr(cls, '__display_keys__', tuple(fks.get(name, name) for name in names))
+        return fk_map
+        
     def __post_init__(self): 
-        self.type    = self.TYPE        
-        foreign_keys = []
+        self.type = self.TYPE
+        T         = type(self)
         
-        for fld in fields(self):
+        for name, key in T._fk_map():
             """
             for every `.fk_somename` field create an `.somename` attribute
             `.somename` will be overwritten with the processed contents of `.fk_somename`
@@ -55,37 +86,20 @@ class Entry(Dataclass_mi):
                 * keys : self.fk_somename = unique1, unique2, unique3
                 * query: self.fk_somename = 'entrytype: title <%. "a"'
             """
-            if m := FOREIGNKEY(fld.name):
-                 key = m.group('key')
-                 
-                 if getattr(self, fld.name, None) or (not getattr(self, key, None)):
-                     setattr(self, key, None)
-                     
-                 foreign_keys.append(key)
+            if getattr(self, name, None) or (not getattr(self, key, None)):
+                setattr(self, key, None)
         
-        self.__fk = tuple(foreign_keys)  
+        self.__fk = T.__fk_keys__
                  
     def __str__(self) -> str:
-        obj = dict()
+        T = type(self)
+        T._fk_map()
         
-        for f in fields(self):
-            key = f.name
-            if m := FOREIGNKEY(key):
-                 key = m.group('key')
-
-            # use the fk results instead of the fk key(s)
-            obj[key] = self.__serialize(getattr(self, key, None))
+        # use the fk results instead of the fk key(s)
+        # Entry|Iterable[Entry] become dict|Iterable[dict] in the same walk
+        obj = {key:_to_dict(getattr(self, key, None)) for key in T.__display_keys__}
                 
-        return json.dumps(obj, indent=4)
-        
-    # convert all Entry|Iterable[Entry] to dict|Iterable[dict]
-    # else value unchanged
-    def __serialize(self, value:Any) -> Any:
-        if isinstance(value, list|tuple|set):
-            value = type(value)(map(self.__serialize, value))
-        elif isinstance(value, Entry):
-            value = value.asdict
-        return value
+        return _dumps(obj, True)
   
 
 # when retrieving a Tag from the database, you get back the value of `data`
@@ -98,8 +112,10 @@ class Tag(Entry):
     
             
 class Database:
-    TYPES   = (Entry,) # overwrite in a subclass
-    ZIP_EXT = 'jiz'   # JSON in .zip (technically .7z)
+    TYPES   = (Entry,)    # overwrite in a subclass
+    ZIP_EXT = 'jiz'       # JSON in .zip (technically .7z)
+    ZST_EXT = 'jzs'       # JSON in .zst (only used if zstandard is installed)
+    STORE   = ShelfStore  # overwrite with SqliteStore for an sqlite backed database
 
     @property
     def _bin(self) -> dict:
@@ -111,7 +127,7 @@ class Database:
         self.__session_bin = dict()
         
         # if the database doesn't exist - try to restore, else create
-        if not (wipe or os.path.isfile(f'{self._db}.dat')):
+        if not (wipe or self.STORE.exists(self._db)):
             try   : self.restore()
             except: self.wipe()
         elif wipe: self.wipe()
@@ -121,35 +137,23 @@ class Database:
         
     # entire database as "pretty-printed" json string
     def __str__(self) -> str:
-        result = '{}'
-        with shelve.open(self._db) as db:
-            result = json.dumps(dict(db), indent=4, default=str)
-        return result
+        with self._open() as db:
+            return _dumps(dict(db.items()), True)
         
     # entire database as json string
     def __repr__(self) -> str:
-        result = '{}'
-        with shelve.open(self._db) as db:
-            result = json.dumps(dict(db), default=str)
-        return result
+        with self._open() as db:
+            return _dumps(dict(db.items()))
        
     # get database entry by key or query     
     def __getitem__(self, query:str) -> Any:
         for entry in self.query_all(query, cast=False): 
             break
         else:
-            with shelve.open(self._db) as db:
+            with self._open() as db:
                 entry = db.get(query, {})
                 
-        if not (enttype := entry.get('type')):
-            raise ValueError('entry has an empty or missing `type` field')
-        
-        self.__is_registered(enttype)
-        
-        T     = self.__registered.get(enttype)
-        entry = self.__foreign_keys(T(**entry))
-        
-        return entry if not isinstance(entry, Tag) else entry.data
+        return self.__cast(entry)
         
     # set database entry by key
     def __setitem__(self, eid:str, entry:Entry) -> None:
@@ -162,14 +166,14 @@ class Database:
         eid = entry.unique if eid is UNIQUE else eid
             
         # store entry in database as dictionary
-        with shelve.open(self._db) as db:
+        with self._open() as db:
             db[f'{eid}'] = entry.asdict
             
     # delete database entr(y|ies) by key(s)
     # all deleted items are stored locally until the app is closed, the bin is emptied or a subclass manually deletes a bin key
     def __delitem__(self, eids:Iterable) -> None:
         eids = list(map(str, eids)) if isinstance(eids, list|tuple|set) else (f'{eids}',)
-        with shelve.open(self._db) as db:
+        with self._open() as db:
             for eid in eids:
                 if (entry := db.get(eid)): 
                     self.__session_bin[eid] = entry
@@ -196,83 +200,158 @@ class Database:
             
         self.__is_registered(entry.type)
     
-    def __entry(self, entry:Any, conditions:str, cast:bool=True) -> Entry:
+    # raw database dict to it's registered type with all foreign keys processed
+    # Tag is always returned as it's `.data`
+    def __cast(self, entry:dict) -> Any:
+        if not (enttype := entry.get('type')):
+            raise ValueError('entry has an empty or missing `type` field')
+        
+        enttype = sys.intern(enttype)
+        self.__is_registered(enttype)
+        
+        T     = self.__registered.get(enttype)
+        entry = self.__foreign_keys(T(**entry))
+        
+        return entry if not isinstance(entry, Tag) else entry.data
+        
+    # `match` is a compiled `Query` predicate
+    def __entry(self, entry:Any, match:Callable, cast:bool=True) -> Entry:
         if isinstance(entry, Entry):
             raw = entry.asdict
             
-            if Query.check_conditions(raw, conditions):
+            if match(raw):
                 return entry if cast else raw
                 
         return None
         
     # get registered entry type or default to "all"
     def __enttype(self, enttype:str|None) -> str:
-        if enttype:
-            try   : self.__is_registered(enttype)
-            except: enttype = None
-        return enttype or Entry.TYPE 
+        return enttype if (enttype and f'{enttype}' in self.__registered) else Entry.TYPE
+    
+    # stable ascending order of `ids` as indexes
+    # all int ids are argsorted as one array, anything else falls back to `sorted`
+    @staticmethod
+    def __id_order(ids:list) -> Iterable:
+        if np is not None and all(type(i) is int for i in ids):
+            try   : return np.argsort(np.fromiter(ids, dtype=np.int64, count=len(ids)), kind='stable').tolist()
+            except: ... # an id doesn't fit in int64
+            
+        return sorted(range(len(ids)), key=ids.__getitem__)
     
     # whack-a-mole: default or custom filename for zip backup    
-    def __zippath(self, name:str|None=None) -> str:
-        return f'{self._db}.{self.ZIP_EXT}' if not name else os.path.abspath(os.path.join(DAT, f'{name}.{self.ZIP_EXT}'))
+    def __zippath(self, name:str|None=None, ext:str|None=None) -> str:
+        ext = ext or self.ZIP_EXT
+        return f'{self._db}.{ext}' if not name else os.path.abspath(os.path.join(DAT, f'{name}.{ext}'))
+        
+    # write the entire database to `file` as json, one entry at a time
+    def __write_json(self, file) -> None:
+        sep = b'{'
+        for eid, entry in self._iter_raw():
+            file.write(sep + f'{_dumps(eid)}:{_dumps(entry)}'.encode())
+            sep = b','
+            
+        file.write(b'{}' if sep == b'{' else b'}')
+    
+    # raw entries for every key that exists, from one open
+    def _exists_many(self, keys:Iterable) -> dict:
+        with self._open() as db:
+            return {key:entry for key in keys if (entry := db.get(key)) is not None}
+    
+    # entries of type=enttype that match numeric-only conditions, checked a column at a time
+    # None if the conditions (or the field values) can't be checked that way
+    def __select_numeric(self, T:type, enttype:str, conditions:str) -> list|None:
+        if not (numeric := Query.compile_numeric(conditions)):
+            return None
+            
+        fields, select   = numeric
+        names            = frozenset(T._field_names())
+        entries, columns = [], [[] for _ in fields]
+        
+        # the entries are kept from this one pass, so the matches never need a second trip to the database
+        for _, raw in self._iter_raw(enttype):
+            entries.append(entry := T(**raw))
+            for column, field in zip(columns, fields):
+                column.append(getattr(entry, field) if field in names else None)
+                
+        if (rows := select(columns)) is None:
+            return None
+            
+        return [entries[i] for i in rows]
     
     # process all foreign keys for this entry
     def __foreign_keys(self, entry:Entry) -> Entry:
         self.__is_registered_entry(entry)
         
-        for key in entry.foreign_keys:
-            if fk := getattr(entry, f'fk_{key}', None):
-                T = type(fk)
-                
-                for fk_key in (fk if isinstance(fk, list|tuple) else (f'{fk}', )):
-                    # if fk_key is a query, store query results
-                    if results := [result for result in self.query_all(fk_key)]:
-                        setattr(entry, key, results)
-                    # else try fk_key as 1 or more keys
+        # every fk_key of every foreign key, in order
+        fks = [(key, fk, (fk if isinstance(fk, list|tuple) else (f'{fk}', )))
+               for key in entry.foreign_keys if (fk := getattr(entry, f'fk_{key}', None))]
+        
+        # keys (not queries) are all read in one go - the store is only opened if there are any
+        keys = {f'{k}' for *_, fk_keys in fks for k in fk_keys if not Query.params(f'{k}')}
+        raws = self._exists_many(keys) if keys else {}
+        
+        for key, fk, fk_keys in fks:
+            T = type(fk)
+            
+            for fk_key in fk_keys:
+                # if fk_key is a query, store query results
+                if Query.params(f'{fk_key}') and (results := [result for result in self.query_all(fk_key)]):
+                    setattr(entry, key, results)
+                # else try fk_key as 1 or more keys
+                else:
+                    # same as `self.exists(fk_key)`, minus the trip to the database
+                    try   : value = self.__cast(raws[fk_key])
+                    except: value = None
+                    
+                    if not value: 
+                        raise KeyError(f'{fk_key} does not exist in the database')
+                        
+                    if isinstance(fk, list|tuple):
+                        targ = getattr(entry, key, (t := T())) or t # `or t` - entry.key could be None
+                        targ = T((*targ, value))
+                        setattr(entry, key, targ)
+                    elif isinstance(fk, str):
+                        setattr(entry, key, T(value))
                     else:
-                        if not (value := self.exists(fk_key)): 
-                            raise KeyError(f'{fk_key} does not exist in the database')
-                            
-                        if isinstance(fk, list|tuple):
-                            targ = getattr(entry, key, (t := T())) or t # `or t` - entry.key could be None
-                            targ = T((*targ, value))
-                            setattr(entry, key, targ)
-                        elif isinstance(fk, str):
-                            setattr(entry, key, T(value))
-                        else:
-                            raise ValueError(f'{T} must be list, tuple, or str')
+                        raise ValueError(f'{T} must be list, tuple, or str')
                         
         return entry
         
     # EMULATORS  
         
+    # every store access goes through here, so an operation only ever needs one handle
+    @contextmanager
+    def _open(self, flag:str='c') -> Iterator:
+        with self.STORE(self._db, flag) as db:
+            yield db
+        
+    # single pass over the raw (key, dict) pairs of entries of type=enttype
+    def _iter_raw(self, enttype:str|None=None) -> Iterator:
+        enttype = self.__enttype(enttype)
+        
+        with self._open() as db:
+            yield from db.typed_items(None if enttype == Entry.TYPE else enttype)
+        
     # get database keys from entries of type=enttype
     def keys(self, enttype:str|None=None) -> Iterator:
         enttype = self.__enttype(enttype)
         
-        with shelve.open(self._db) as db:
-             for key in db.keys():
-                if enttype in (Entry.TYPE, db[key].get('type')):
-                    yield key
+        with self._open() as db:
+            yield from db.typed_keys(None if enttype == Entry.TYPE else enttype)
       
     # get database values from entries of type=enttype
     # True|False - cast entry to type
     def values(self, enttype:str|None=None, cast:bool=True) -> Iterator:
-        for eid in self.keys(enttype):
-            # this will not be an Entry, only if it was a Tag
-            # Tag is always returned as it's `.data`
-            if isinstance((entry := self[eid]), Entry) and not cast:
-                entry = entry.asdict
-                
+        for _, entry in self.items(enttype, cast):
             yield entry
       
     # get database items from entries of type=enttype
     # True|False - cast entry to type
     def items(self, enttype:str|None=None, cast:bool=True) -> Iterator:
-        for eid in self.keys(enttype):
+        for eid, entry in self._iter_raw(enttype):
             # this will not be an Entry, only if it was a Tag
             # Tag is always returned as it's `.data`
-            if isinstance((entry := self[eid]), Entry) and not cast:
+            if isinstance((entry := self.__cast(entry)), Entry) and not cast:
                 entry = entry.asdict
                 
             yield eid, entry
@@ -286,7 +365,7 @@ class Database:
     
     # (overwrite|create) empty database
     def wipe(self) -> None:
-        with shelve.open(self._db, flag='n'):
+        with self._open('n'):
             ...  
             
     # TRANSFORMERS
@@ -298,44 +377,70 @@ class Database:
         results = dict()
         for T in (*self.TYPES, Tag):
             if entries := self.todict(T.TYPE):
-                items = sorted(entries.items(), key=lambda it: it[-1].get('id'))
-                results.update(dict(items))
+                # sort the ids alone and gather the keys by the resulting order
+                keys = list(entries)
+                ids  = [entry.get('id') for entry in entries.values()]
+                
+                for i in self.__id_order(ids):
+                    results[keys[i]] = entries[keys[i]]
             
         #print(json.dumps(results, indent=4))
         self._dict2db(results, True)
         
     # all database entries of `.type`==enttype as dictionary
+    # one pass over the raw entries - foreign keys are not processed because only fields are kept
     def todict(self, enttype:str|None=None) -> dict:
-        enttype = self.__enttype(enttype)
         results = dict()
         
-        if enttype == Tag.TYPE:
-            with shelve.open(self._db) as db:
-                results.update({k:v for k,v in db.items() if enttype in (Entry.TYPE, v.get('type'))})
-        else:
-            results = dict(self.items(enttype, False))
-            
-            # if we are getting all entries, we have to manually get tags
-            if enttype == Entry.TYPE:
-                results.update(self.todict(Tag.TYPE))
+        for eid, entry in self._iter_raw(enttype):
+            # Tag is kept "as-is" because casting it would return `.data`
+            if (T := entry.get('type')) != Tag.TYPE:
+                self.__is_registered(T)
+                entry = self.__registered.get(T)(**entry).asdict
+                
+            results[eid] = entry
             
         return results
      
-    # dump database to zipped json without indent 
+    # dump database to compressed json without indent
+    # entries are streamed, so the database is never held in memory as one string
     def backup(self, name:str|None=None) -> None:
-        with zf.ZipFile(self.__zippath(name), mode='w', compression=zf.ZIP_LZMA) as zip:
-            zip.writestr('database.json', repr(self))
+        path = self.__zippath(name, self.ZST_EXT) if zstd else self.__zippath(name)
+        
+        # the backup is streamed into a temp file and only swapped in once it is complete,
+        # so a failure part way through leaves the previous backup untouched
+        temp = f'{path}.tmp'
+        try:
+            if zstd:
+                with open(temp, 'wb') as fh:
+                    with zstd.ZstdCompressor(threads=-1).stream_writer(fh) as file:
+                        self.__write_json(file)
+            else:
+                with zf.ZipFile(temp, mode='w', compression=zf.ZIP_LZMA) as zip:
+                    with zip.open('database.json', mode='w', force_zip64=True) as file:
+                        self.__write_json(file)
+        except:
+            if os.path.isfile(temp): os.remove(temp)
+            raise
+            
+        os.replace(temp, path)
          
-    # load database from zip file         
+    # load database from the most recent backup file
     def restore(self, name:str|None=None) -> None:
-        path = self.__zippath(name)
+        path  = self.__zippath(name)
+        paths = [p for p in (path, zstd and self.__zippath(name, self.ZST_EXT)) if p and os.path.isfile(p)]
         
-        if not os.path.isfile(path):
+        if not paths:
             raise ValueError(f'{path} does not exist')
             
-        with zf.ZipFile(path, mode='r') as zip:
-            with zip.open('database.json') as file:
-                self._dict2db(json.load(file), True)
+        if (path := max(paths, key=os.path.getmtime)).endswith(f'.{self.ZST_EXT}'):
+            with open(path, 'rb') as fh:
+                with zstd.ZstdDecompressor().stream_reader(fh) as file:
+                    self._dict2db(_loads(file.read()), True)
+        else:
+            with zf.ZipFile(path, mode='r') as zip:
+                with zip.open('database.json') as file:
+                    self._dict2db(_loads(file.read()), True)
             
     # include `data` in the database  
     # overwrite will completely wipe the database without saving
@@ -345,7 +450,7 @@ class Database:
             raise ValueError('The `data` argument must be of type dict[eid, Any]')
         
         flag = ('c','n')[overwrite]
-        with shelve.open(self._db, flag=flag) as db:
+        with self._open(flag) as db:
             for eid, entry in data.items():
             
                 if not (enttype := entry.get('type')):
@@ -371,39 +476,55 @@ class Database:
     def query_all(self, query:str, cast:bool=True) -> Iterator:
         if params := Query.params(query):
             typekey, conditions = params
+            match = Query.compile(conditions)
             
             if entry := self.exists(typekey):
                 if isinstance(entry, list|tuple|set):
                     for ent in entry:
-                        if ent := self.__entry(ent, conditions, cast):
+                        if ent := self.__entry(ent, match, cast):
                             yield ent
                                 
-                elif entry := self.__entry(entry, conditions, cast):
+                elif entry := self.__entry(entry, match, cast):
                     yield entry
                             
             else:
                 self.__is_registered(typekey)
                 
-                for entry in self.values(typekey):
-                    if entry := self.__entry(entry, conditions, cast):
-                        yield entry
+                # when a foreign key overwrites a field (ex: Tag.data) the conditions have to see the processed entry
+                # "all" mixes every type, so it is always checked that way too
+                # otherwise, conditions are checked on the entry built without it's foreign keys
+                # (so defaults and `__post_init__` still apply) and only matches have them processed
+                T = self.__registered.get(typekey)
+                T._fk_map()
+                
+                if (typekey == Entry.TYPE) or (set(T.__fk_keys__) & set(T._field_names())):
+                    for entry in self.values(typekey):
+                        if entry := self.__entry(entry, match, cast):
+                            yield entry
+                else:
+                    if (entries := self.__select_numeric(T, typekey, conditions)) is None:
+                        entries = (entry for entry in (T(**raw) for _, raw in self._iter_raw(typekey)) if match(entry.asdict))
+                        
+                    for entry in entries:
+                        entry = self.__foreign_keys(entry)
+                        yield entry if cast else entry.asdict
     
     # get a count of enttype entries
     def count(self, enttype:str) -> int:
-        return sum(1 for _ in self.keys(enttype))
+        enttype = self.__enttype(enttype)
+        
+        with self._open() as db:
+            return db.count(None if enttype == Entry.TYPE else enttype)
         
     # get the next available id number for an enttype
     def next_id(self, enttype:str) -> int:
-        m = -1
+        # ids are read straight from the raw entries - nothing needs to be cast
+        enttype = self.__enttype(enttype)
         
-        # Tag is always returned as it's `.data` value
-        # we have to be more direct if we want to read Tag ids
-        if enttype == Tag.TYPE:
-            with shelve.open(self._db) as db:
-                m = max([m, *(x.get('id') for key in db.keys() if enttype == (x := db[key]).get('type'))]) + 1
-        else:
-            m = max([m, *(x.id for x in self.values(enttype))]) + 1
-        return m
+        with self._open() as db:
+            m = db.max_id(None if enttype == Entry.TYPE else enttype)
+            
+        return (-1 if m is None else m) + 1
         
     # check if an id is available for an enttype
     def is_unique_id(self, enttype:str, uid:int) -> bool:
@@ -0,0 +1,205 @@
+import math, os, shelve, sqlite3
+from   collections.abc import MutableMapping
+from   typing          import Any, Iterator
+from   .mixins         import _dumps, _loads
+
+__all__ = 'ShelfStore', 'SqliteStore'
+
+
+# both stores behave like a `shelve.Shelf` of `dict` entries, plus:
+#   exists(path)       : does a store already exist at path
+#   typed_keys(type)   : keys of entries of `.type`==type (None for all)
+#   typed_items(type)  : (key, entry) pairs of entries of `.type`==type (None for all)
+#   count(type)        : number of entries of `.type`==type (None for all)
+#   max_id(type)       : highest entry id of `.type`==type (None for all) or None
+
+
+# the original pickle-backed dbm store
+# a `type -> {key:None}` index is kept under INDEX_KEY, so typed lookups never read other entries
+# the index is hidden from iteration and only written back when a modified store is closed
+class ShelfStore(shelve.DbfilenameShelf):
+    INDEX_KEY = '__index__'
+
+    @staticmethod
+    def exists(path:str) -> bool:
+        return os.path.isfile(f'{path}.dat')
+
+    def __init__(self, path:str, flag:str='c'):
+        shelve.DbfilenameShelf.__init__(self, path, flag)
+        self._dirty = False
+
+        try:
+            self._index = shelve.Shelf.__getitem__(self, self.INDEX_KEY)
+        except KeyError:
+            # databases from before the index existed are indexed once, in their current order
+            self._index = dict()
+            for key, entry in self.items():
+                self._index.setdefault(entry.get('type'), dict())[key] = None
+                
+            # it is persisted right away by a short-lived handle, so this handle stays unmodified
+            # a read-only handle must never write on close - it would undo what nested handles wrote meanwhile
+            if self._index and (flag != 'r'):
+                with shelve.DbfilenameShelf(path, 'w') as db:
+                    shelve.Shelf.__setitem__(db, self.INDEX_KEY, self._index)
+
+    def __iter__(self) -> Iterator:
+        for key in shelve.Shelf.__iter__(self):
+            if key != self.INDEX_KEY:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(map(len, self._index.values()))
+
+    def __setitem__(self, key:str, entry:dict) -> None:
+        if key == self.INDEX_KEY:
+            raise ValueError(f'{key} is reserved for the store\'s type index')
+            
+        shelve.Shelf.__setitem__(self, key, entry)
+
+        # an overwritten key keeps it's place unless it's type changed
+        if key not in (keys := self._index.setdefault(entry.get('type'), dict())):
+            for other in self._index.values():
+                other.pop(key, None)
+            keys[key] = None
+
+        self._dirty = True
+
+    def __delitem__(self, key:str) -> None:
+        shelve.Shelf.__delitem__(self, key)
+
+        for keys in self._index.values():
+            keys.pop(key, None)
+
+        self._dirty = True
+
+    def typed_keys(self, enttype:str|None=None) -> Iterator:
+        if enttype is None: return iter(self)
+        return iter(tuple(self._index.get(enttype, ())))
+
+    def typed_items(self, enttype:str|None=None) -> Iterator:
+        for key in self.typed_keys(enttype):
+            yield key, self[key]
+
+    def count(self, enttype:str|None=None) -> int:
+        return len(self) if enttype is None else len(self._index.get(enttype, ()))
+
+    def max_id(self, enttype:str|None=None) -> Any:
+        return max((entry.get('id') for _, entry in self.typed_items(enttype)), default=None)
+
+    def close(self) -> None:
+        if getattr(self, '_dirty', False):
+            self._dirty = False
+            shelve.Shelf.__setitem__(self, self.INDEX_KEY, self._index)
+        shelve.DbfilenameShelf.close(self)
+
+
+# raise if `value` would not read back exactly as it was written through json
+# (ex: tuples come back as lists, ints past 64 bits as floats, sets and other objects can't be written at all)
+# NaN and infinity are written as bare `NaN`/`Infinity`, which sqlite's json functions reject as malformed
+# `fk_*` fields are only ever read as a sequence of keys, so a tuple there is as good as a list
+def _check_json(value:Any, seqs:tuple=(list,)) -> None:
+    if (T := type(value)) in (str, bool) or value is None:
+        return
+        
+    if T is float:
+        if not math.isfinite(value):
+            raise ValueError(f'{value}: NaN and infinite floats can not be stored in a SqliteStore')
+    elif T is int:
+        if not (-2**63 <= value < 2**63):
+            raise ValueError(f'{value}: ints past 64 bits can not be stored in a SqliteStore')
+    elif T in seqs:
+        for item in value:
+            _check_json(item)
+    elif T is dict:
+        for key, item in value.items():
+            if type(key) is not str:
+                raise ValueError(f'{key!r}: only str keys can be stored in a SqliteStore')
+            _check_json(item)
+    else:
+        raise ValueError(f'{T.__name__} values can not be stored in a SqliteStore - they do not survive json')
+
+
+# entries stored as json text in a single indexed table, listed in insertion (rowid) order
+# filtering by type and finding the highest id are done by sqlite
+class SqliteStore(MutableMapping):
+    EXT = 'sqlite'
+
+    @staticmethod
+    def exists(path:str) -> bool:
+        return os.path.isfile(f'{path}.{SqliteStore.EXT}')
+
+    def __init__(self, path:str, flag:str='c'):
+        self._con = sqlite3.connect(f'{path}.{self.EXT}')
+
+        # 'n': always start with an empty store
+        if flag == 'n':
+            self._con.execute('DROP TABLE IF EXISTS entries')
+
+        self._con.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, type TEXT, data TEXT)')
+        self._con.execute('CREATE INDEX IF NOT EXISTS entries_type ON entries (type)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getitem__(self, key:str) -> dict:
+        if (row := self._con.execute('SELECT data FROM entries WHERE key=?', (key,)).fetchone()) is None:
+            raise KeyError(key)
+        return _loads(row[0])
+
+    def __setitem__(self, key:str, entry:dict) -> None:
+        for name, value in entry.items():
+            _check_json(value, ((list,), (list, tuple))[name.startswith('fk_')])
+        # an upsert keeps the rowid of an overwritten key, so it keeps it's place like it does in shelve
+        self._con.execute('INSERT INTO entries VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET type=excluded.type, data=excluded.data',
+                          (key, entry.get('type'), _dumps(entry)))
+
+    def __delitem__(self, key:str) -> None:
+        if not self._con.execute('DELETE FROM entries WHERE key=?', (key,)).rowcount:
+            raise KeyError(key)
+
+    def __contains__(self, key:Any) -> bool:
+        return self._con.execute('SELECT 1 FROM entries WHERE key=?', (key,)).fetchone() is not None
+
+    # rows are fetched up front so nothing holds a read lock while the caller writes
+    def __iter__(self) -> Iterator:
+        for (key,) in self._con.execute('SELECT key FROM entries ORDER BY rowid').fetchall():
+            yield key
+
+    def __len__(self) -> int:
+        return self._con.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def items(self) -> Iterator:
+        return self.typed_items()
+
+    def typed_keys(self, enttype:str|None=None) -> Iterator:
+        if enttype is None: rows = self._con.execute('SELECT key FROM entries ORDER BY rowid')
+        else              : rows = self._con.execute('SELECT key FROM entries WHERE type=? ORDER BY rowid', (enttype,))
+
+        for (key,) in rows.fetchall():
+            yield key
+
+    def typed_items(self, enttype:str|None=None) -> Iterator:
+        if enttype is None: rows = self._con.execute('SELECT key, data FROM entries ORDER BY rowid')
+        else              : rows = self._con.execute('SELECT key, data FROM entries WHERE type=? ORDER BY rowid', (enttype,))
+
+        for key, data in rows.fetchall():
+            yield key, _loads(data)
+
+    def count(self, enttype:str|None=None) -> int:
+        if enttype is None: return len(self)
+        return self._con.execute('SELECT COUNT(*) FROM entries WHERE type=?', (enttype,)).fetchone()[0]
+
+    def max_id(self, enttype:str|None=None) -> Any:
+        sql = "SELECT MAX(json_extract(data, '$.id')) FROM entries"
+        if enttype is None: row = self._con.execute(sql).fetchone()
+        else              : row = self._con.execute(f'{sql} WHERE type=?', (enttype,)).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        if self._con:
+            self._con.commit()
+            self._con.close()
+            self._con = None